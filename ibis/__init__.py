@@ -20,6 +20,7 @@ from .metadata import version as __version__
 
 from .ibis_serial import SerialIBISMaster
 from .ibis_tcp import TCPIBISMaster
+from .ibis_async import AsyncIBISMaster
 
 from .mono_serial import SerialMONOMaster
 
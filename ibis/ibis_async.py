@@ -0,0 +1,237 @@
+import asyncio
+
+try:
+    import serial_asyncio
+except ImportError:
+    _HAS_SERIAL_ASYNCIO = False
+else:
+    _HAS_SERIAL_ASYNCIO = True
+
+from .ibis_protocol import IBISProtocol
+
+class AsyncIBISMaster(IBISProtocol):
+    """
+    An IBIS master using asyncio streams, so that polls on several
+    buses or connections can be awaited concurrently (e.g. with
+    asyncio.gather). Create instances with open_tcp or open_serial.
+    Only send_telegram_async and the *_async query methods can be used,
+    the synchronous senders raise a RuntimeError.
+    """
+    
+    def __init__(self, reader, writer, timeout = 2.0, *args, **kwargs):
+        """
+        reader:
+        The asyncio StreamReader to receive replies from
+        
+        writer:
+        The asyncio StreamWriter to send telegrams to
+        
+        timeout:
+        How long to wait for a reply in seconds
+        """
+        
+        super().__init__(*args, **kwargs)
+        
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        # The bus only allows one telegram and reply at a time
+        self._lock = asyncio.Lock()
+        # Received frames, filled by _read_replies after the first send
+        self._replies = asyncio.Queue()
+        self._reader_task = None
+    
+    @classmethod
+    async def open_tcp(cls, host, port, *args, **kwargs):
+        """
+        Connect to an IBIS master via TCP
+        
+        host:
+        The hostname or IP to connect to
+        
+        port:
+        The TCP port to use for communication
+        """
+        
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer, *args, **kwargs)
+    
+    @classmethod
+    async def open_serial(cls, port, baudrate = 1200, bytesize = 7,
+                          parity = 'E', stopbits = 2, *args, **kwargs):
+        """
+        Open a serial port for IBIS communication
+        
+        port:
+        The serial port to use for communication
+        """
+        
+        if not _HAS_SERIAL_ASYNCIO:
+            raise RuntimeError("The pyserial-asyncio module is not installed. It is required for asynchronous serial communication.")
+        
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url = port,
+            baudrate = baudrate,
+            bytesize = bytesize,
+            parity = parity,
+            stopbits = stopbits
+        )
+        return cls(reader, writer, *args, **kwargs)
+    
+    def _send(self, telegram):
+        """
+        Synchronous sending would bypass the lock guarding the bus,
+        use the *_async methods instead
+        """
+        
+        raise RuntimeError("AsyncIBISMaster can't send synchronously, use send_telegram_async or the *_async query methods")
+    
+    def _receive(self, length):
+        """
+        Replies can't be received synchronously,
+        use the *_async methods instead
+        """
+        
+        raise RuntimeError("AsyncIBISMaster can't receive synchronously, use send_telegram_async or the *_async query methods")
+    
+    async def _read_replies(self):
+        """
+        Split the received data into frames at the end byte (plus checksum),
+        so a reply arriving after its query timed out can be told apart
+        and dropped instead of shifting every later reply
+        """
+        
+        try:
+            while True:
+                frame = await self.reader.readuntil(b"\r")
+                frame += await self.reader.readexactly(1)
+                self._replies.put_nowait(frame)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            # None marks the connection as closed
+            self._replies.put_nowait(None)
+    
+    def _discard_replies(self):
+        """
+        Drop frames that arrived without being waited for
+        """
+        
+        while not self._replies.empty():
+            if self._replies.get_nowait() is None:
+                self._replies.put_nowait(None)
+                raise ConnectionError("Connection closed by remote host")
+    
+    async def _receive_reply(self, reply_length):
+        """
+        Wait for a frame of the expected length,
+        dropping leftovers of earlier replies
+        """
+        
+        while True:
+            reply = await self._replies.get()
+            if reply is None:
+                self._replies.put_nowait(None)
+                raise ConnectionError("Connection closed by remote host")
+            if len(reply) == reply_length + 2:
+                return reply
+    
+    async def send_telegram_async(self, telegram, reply_length = 0):
+        """
+        Send an arbitrary telegram and wait for it to be written.
+        Checksum and end byte will be added.
+        
+        telegram:
+        The telegram to send (as a string or bytes)
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        Returns:
+        The received telegram OR None
+        
+        Raises:
+        asyncio.TimeoutError if the reply does not arrive in time
+        ConnectionError if the connection has been closed
+        """
+        
+        if type(telegram) is str:
+            telegram = self.process_special_characters(telegram)
+        telegram = self.wrap_telegram(telegram)
+        async with self._lock:
+            if self._reader_task is None:
+                self._reader_task = asyncio.ensure_future(self._read_replies())
+            self._discard_replies()
+            self.debug_telegram(telegram)
+            self.writer.write(telegram)
+            await self.writer.drain()
+            if reply_length:
+                reply = await asyncio.wait_for(
+                    self._receive_reply(reply_length), self.timeout)
+                self.debug_telegram(reply, receive = True)
+                reply = reply[:-2]
+                return reply.decode('latin1')
+    
+    async def _query_async(self, telegram, reply_length, parser):
+        """
+        Send a query telegram and parse the reply
+        
+        telegram:
+        The query telegram (as bytes)
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        parser:
+        The parse_DSxxx method for the reply
+        """
+        
+        return parser(await self.send_telegram_async(telegram,
+            reply_length = reply_length))
+    
+    async def DS020_async(self, address):
+        """
+        Display status query, as DS020
+        """
+        
+        return await self._query_async(*self._DS020_query(address))
+    
+    async def DS201_async(self, address):
+        """
+        Display version query, as DS201
+        """
+        
+        return await self._query_async(*self._DS201_query(address))
+    
+    async def DS060_async(self, direction):
+        """
+        Query locating device status, as DS060
+        """
+        
+        return await self._query_async(*self._DS060_query(direction))
+    
+    async def DS601_async(self, direction):
+        """
+        Query locating device version, as DS601
+        """
+        
+        return await self._query_async(*self._DS601_query(direction))
+    
+    async def DS061_async(self, direction):
+        """
+        Query locating device data, as DS061
+        """
+        
+        return await self._query_async(*self._DS061_query(direction))
+    
+    async def close(self):
+        """
+        Close the underlying connection
+        """
+        
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        self.writer.close()
+        await self.writer.wait_closed()
@@ -1,4 +1,69 @@
-import math
+import re
+import string
+
+# NumPy is optional and slow to import, see _get_numpy
+_numpy = None
+
+# Checksum strategy by telegram length (measured): a plain loop is fastest
+# for short telegrams, the integer fold from here on, and NumPy (which has
+# ~2 us fixed overhead) only for very long ones
+_FOLD_XOR_MIN_LENGTH = 64
+_NUMPY_XOR_MIN_LENGTH = 384
+
+# VDV hexadecimal digits and a table mapping them to regular hex digits
+_VDVHEX = "0123456789:;<=>?"
+_VDVHEX_TO_HEX = str.maketrans(":;<=>?", "ABCDEF")
+# Two-digit VDV hex representation of every byte value, as bytes
+_VDVHEX_PAIRS = tuple((_VDVHEX[value >> 4] + _VDVHEX[value & 0x0F])
+    .encode('ascii') for value in range(256))
+# Byte table with the same output as vdv_hex: one digit up to 15, two above
+_VDVHEX_BYTES = tuple(pair[1:] if value < 16 else pair
+    for value, pair in enumerate(_VDVHEX_PAIRS))
+# Byte table replacing non-printable characters with dots for debug output
+_PRINTABLE = bytes(value if 32 <= value < 127 else 0x2E for value in range(256))
+
+def _xor_fold(data):
+    """
+    XOR all bytes of data together without looping over them in Python.
+    The data is read as one integer which is then folded in half until
+    only the lowest byte is left. Only pays off for long telegrams.
+    """
+    
+    value = int.from_bytes(data, 'little')
+    shift = (8 << (len(data) - 1).bit_length()) >> 1 if len(data) > 1 else 0
+    while shift >= 8:
+        value ^= value >> shift
+        shift >>= 1
+    return value & 0xFF
+
+def _get_numpy():
+    """
+    Import NumPy on first use
+    
+    Returns:
+    The numpy module OR False if it is not installed
+    """
+    
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+def _xor_reduce(data):
+    """
+    XOR all bytes of data together, for data long enough that avoiding
+    a plain Python loop pays off (see _FOLD_XOR_MIN_LENGTH)
+    """
+    
+    if len(data) >= _NUMPY_XOR_MIN_LENGTH:
+        np = _get_numpy()
+        if np:
+            return int(np.bitwise_xor.reduce(np.frombuffer(data, dtype = np.uint8)))
+    return _xor_fold(data)
 
 class IBISProtocol:
     """
@@ -59,18 +124,10 @@ class IBISProtocol:
         """
         pass
 
-    def _printable(self, char):
-        """
-        Replace non-printable chars with printable variants.
-        """
-        if char in range(0, 32):
-            return "<{:02X}>".format(char)
-        else:
-            return chr(char)
-    
     def debug_telegram(self, telegram, receive = False):
         """
         Print a telegram to standard output if the debug flag is set.
+        Non-printable characters are shown as dots below their hex value.
         
         telegram:
         The telegram to print
@@ -79,12 +136,14 @@ class IBISProtocol:
         Whether to print the telegram as sent or received
         """
         
-        if self.debug:
-            action = "Received" if receive else "Sending"
-            telegram_debug = "\n".join("{:02X} {}".format(
-                byte, self._printable(byte)) for byte in telegram)
-            print("{} telegram:\n".format(action))
-            print(telegram_debug)
+        if not self.debug:
+            return
+        action = "Received" if receive else "Sending"
+        telegram_hex = telegram.hex(" ").upper()
+        telegram_ascii = "  ".join(telegram.translate(_PRINTABLE).decode('ascii'))
+        print("{} telegram:\n".format(action))
+        print(telegram_hex)
+        print(telegram_ascii)
     
     def process_special_characters(self, telegram):
         """
@@ -97,6 +156,8 @@ class IBISProtocol:
         The processed telegram
         """
         
+        if telegram.isascii():
+            return telegram.encode('ascii')
         telegram = telegram.replace("ä", "{")
         telegram = telegram.replace("ö", "|")
         telegram = telegram.replace("ü", "}")
@@ -109,45 +170,95 @@ class IBISProtocol:
     
     def wrap_telegram(self, telegram):
         """
-        Append the checksum and the end byte to the given telegram.
+        Append the end byte and the checksum to the given telegram.
         
         telegram:
-        The telegram (as a bytearray) to wrap
+        The telegram (as bytes or a bytearray) to wrap, it is not modified
         
         Returns:
-        The wrapped telegram (as a bytearray)
+        The wrapped telegram (as a new bytearray)
         """
         
-        telegram.append(0x0D)
-        checksum = 0x7F
-        for byte in telegram:
-            checksum ^= byte
-        telegram.append(checksum)
-        return telegram
+        wrapped = bytearray(telegram)
+        wrapped.append(0x0D)
+        if len(wrapped) < _FOLD_XOR_MIN_LENGTH:
+            checksum = 0x7F
+            for byte in wrapped:
+                checksum ^= byte
+        else:
+            checksum = _xor_reduce(wrapped) ^ 0x7F
+        wrapped.append(checksum)
+        return wrapped
     
     def send_telegram(self, telegram, reply_length = 0):
         """
         Send an arbitrary telegram. Checksum and end byte will be added.
         
         telegram:
-        The telegram to send
+        The telegram to send (as a string or bytes)
         
         reply_length:
         How many bytes to expect as a reply
         
         Returns:
         The received telegram OR None
-        
-        TODO: Actually check the checksum
         """
         
         if type(telegram) is str:
-            telegram = self.process_special_characters(telegram)
-            telegram = bytearray(telegram)
-        elif type(telegram) is bytes:
-            telegram = bytearray(telegram)
+            return self.send_str(telegram, reply_length = reply_length)
+        return self.send_raw(telegram, reply_length = reply_length)
+    
+    def send_str(self, telegram, reply_length = 0):
+        """
+        Send a telegram given as a string. Special characters will be
+        replaced, checksum and end byte will be added.
+        
+        telegram:
+        The telegram to send (as a string)
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        Returns:
+        The received telegram OR None
+        """
+        
+        return self.send_raw(self.process_special_characters(telegram),
+            reply_length = reply_length)
+    
+    def send_raw(self, telegram, reply_length = 0):
+        """
+        Send an already encoded telegram. Checksum and end byte will be added,
+        no special character processing is done.
+        
+        telegram:
+        The telegram to send (as bytes or a bytearray)
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        Returns:
+        The received telegram OR None
+        """
+        
+        return self._send_finalized(self.wrap_telegram(telegram), reply_length)
+    
+    def _send_finalized(self, telegram, reply_length):
+        """
+        Send a wrapped telegram and receive the reply, if any.
+        
+        telegram:
+        The wrapped telegram, including end byte and checksum
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        Returns:
+        The received telegram OR None
+        
+        TODO: Actually check the checksum
+        """
         
-        telegram = self.wrap_telegram(telegram)
         self.debug_telegram(telegram)
         self._send(telegram)
         if reply_length:
@@ -156,6 +267,26 @@ class IBISProtocol:
             reply = reply[:-2]
             return reply.decode('latin1')
     
+    def send_telegrams(self, telegrams):
+        """
+        Send a batch of telegrams without waiting for replies,
+        e.g. to replay a stop list. Checksum and end byte will be added.
+        All telegrams are sent in a single write.
+        
+        telegrams:
+        An iterable of telegrams to send, as in send_telegram
+        """
+        
+        wrapped = []
+        for telegram in telegrams:
+            if type(telegram) is str:
+                telegram = self.process_special_characters(telegram)
+            telegram = self.wrap_telegram(telegram)
+            self.debug_telegram(telegram)
+            wrapped.append(telegram)
+        if wrapped:
+            self._send(b"".join(wrapped))
+    
     def vdv_hex(self, value):
         """
         Convert a numerical value into the VDV hexadecimal representation
@@ -167,23 +298,43 @@ class IBISProtocol:
         The VDV Hex value OR the integer for the VDV Hex value
         """
         
-        vdvhex = "0123456789:;<=>?"
         if type(value) is int:
             assert 0 <= value <= 255
             if value > 15:
-                high_nibble = value >> 4
-                low_nibble = value % 16
-                return vdvhex[high_nibble] + vdvhex[low_nibble]
+                return _VDVHEX[value >> 4] + _VDVHEX[value & 0x0F]
             else:
-                return vdvhex[value]
+                return _VDVHEX[value]
         else:
             assert 1 <= len(value) <= 2
-            if len(value) == 2:
-                high_nibble = vdvhex.index(value[0])
-                low_nibble = vdvhex.index(value[1])
-                return high_nibble << 4 + low_nibble
-            else:
-                return vdvhex.index(value)
+            # int() alone would also accept whitespace, signs and hex letters
+            if value.strip(_VDVHEX):
+                raise ValueError("Invalid VDV hex value: {!r}".format(value))
+            return int(value.translate(_VDVHEX_TO_HEX), 16)
+    
+    def _compile_byte_format(self, fmt):
+        """
+        Convert a format string containing only decimal integer fields
+        into the equivalent bytes %-format
+        
+        fmt:
+        The format string for the telegram
+        
+        Returns:
+        The bytes format OR None if the format string can't be converted
+        """
+        
+        byte_fmt = ""
+        for literal, field, spec, conversion in string.Formatter().parse(fmt):
+            if not literal.isascii():
+                return None
+            byte_fmt += literal.replace("%", "%%")
+            if field is None:
+                continue
+            if field or conversion or spec[-1:] != "d" \
+                or not (spec[:-1].isdigit() or spec == "d"):
+                return None
+            byte_fmt += "%" + spec
+        return byte_fmt.encode('ascii')
     
     def _tg(self, fmt, reply_length = 0):
         """
@@ -196,9 +347,34 @@ class IBISProtocol:
         As in send_telegram
         """
         
+        # Encode the fixed telegram prefix once, only the formatted
+        # fields need special character processing on every call
+        prefix_length = re.match(r"[^{}]*", fmt).end()
+        prefix = self.process_special_characters(fmt[:prefix_length])
+        fields_fmt = fmt[prefix_length:]
+        def _send_formatted(*args):
+            return self.send_raw(prefix + self.process_special_characters(
+                fields_fmt.format(*args)), reply_length = reply_length)
+        
+        byte_fmt = self._compile_byte_format(fmt)
+        if byte_fmt is None:
+            return _send_formatted
+        
+        # Purely numeric telegrams need no special character processing.
+        # Anything other than the expected number of plain ints takes the
+        # str path, so invalid arguments raise the same errors as before
+        # instead of e.g. floats being truncated by %d
+        field_count = sum(field is not None
+            for literal, field, spec, conversion in string.Formatter().parse(fmt))
         def _send(*args):
-            return self.send_telegram(fmt.format(*args),
-                reply_length = reply_length)
+            if len(args) == field_count:
+                for arg in args:
+                    if type(arg) is not int:
+                        break
+                else:
+                    return self._send_finalized(
+                        self.wrap_telegram(byte_fmt % args), reply_length)
+            return _send_formatted(*args)
         
         return _send
     
@@ -210,8 +386,8 @@ class IBISProtocol:
         The destination text
         """
         
-        num_blocks = math.ceil(len(text) / 16)
-        return self.send_telegram("zA{}{}"
+        num_blocks = (len(text) + 15) >> 4
+        return self.send_str("zA{}{}"
             .format(self.vdv_hex(num_blocks), text.ljust(num_blocks*16)))
     
     def DS003aUESTRA(self, front_text, side_text = "", line_text = "",
@@ -344,8 +520,8 @@ class IBISProtocol:
         data += chr(0x20 + _array_to_byte(bold_text_front[6:8] + bold_text_side[0:4]))
         data += chr(0x20 + _array_to_byte(bold_text_side[4:8]))
         
-        num_blocks = math.ceil(len(data) / 4)
-        return self.send_telegram("zA{:>02}{}"
+        num_blocks = (len(data) + 3) >> 2
+        return self.send_str("zA{:>02}{}"
             .format(self.vdv_hex(num_blocks), data.ljust(num_blocks*4)))
     
     def DS003c(self, text):
@@ -356,8 +532,8 @@ class IBISProtocol:
         The next stop text
         """
         
-        num_blocks = math.ceil(len(text) / 4)
-        return self.send_telegram("zI{}{}"
+        num_blocks = (len(text) + 3) >> 2
+        return self.send_str("zI{}{}"
             .format(self.vdv_hex(num_blocks), text.ljust(num_blocks*4)))
     
     def DS004c(self, text):
@@ -368,8 +544,8 @@ class IBISProtocol:
         The stop text
         """
         
-        num_blocks = math.ceil(len(text) / 4)
-        return self.send_telegram("eT{}{}"
+        num_blocks = (len(text) + 3) >> 2
+        return self.send_str("eT{}{}"
             .format(self.vdv_hex(num_blocks), text.ljust(num_blocks*4)))
     
     def DS010c(self, stop_id):
@@ -380,11 +556,8 @@ class IBISProtocol:
         The ID of the next stop, 1-2 digits
         """
         
-        stop_id_high_nibble = stop_id >> 4
-        stop_id_low_nibble = stop_id & 0x0F
-        return self.send_telegram("xZ{}{}"
-            .format(self.vdv_hex(stop_id_high_nibble),
-                self.vdv_hex(stop_id_low_nibble)))
+        assert 0 <= stop_id <= 255
+        return self.send_raw(b"xZ" + _VDVHEX_PAIRS[stop_id])
     
     def DS010f(self, stop_id, change_text):
         """
@@ -397,16 +570,38 @@ class IBISProtocol:
         Connection information
         """
         
-        stop_id_high_nibble = stop_id >> 4
-        stop_id_low_nibble = stop_id & 0x0F
-        length_high_nibble = len(change_text) >> 4
-        length_low_nibble = len(change_text) & 0x0F
-        return self.send_telegram("xU{}{}{}{}{}"
-            .format(self.vdv_hex(stop_id_high_nibble),
-                self.vdv_hex(stop_id_low_nibble),
-                self.vdv_hex(length_high_nibble),
-                self.vdv_hex(length_low_nibble),
-                change_text))
+        assert 0 <= stop_id <= 255
+        assert 0 <= len(change_text) <= 255
+        return self.send_raw(b"".join((
+            b"xU",
+            _VDVHEX_PAIRS[stop_id],
+            _VDVHEX_PAIRS[len(change_text)],
+            self.process_special_characters(change_text)
+        )))
+    
+    def _query(self, telegram, reply_length, parser):
+        """
+        Send a query telegram and parse the reply
+        
+        telegram:
+        The query telegram (as bytes)
+        
+        reply_length:
+        How many bytes to expect as a reply
+        
+        parser:
+        The parse_DSxxx method for the reply
+        """
+        
+        return parser(self.send_raw(telegram, reply_length = reply_length))
+    
+    def _DS020_query(self, address):
+        """
+        Telegram, reply length and parser for DS020
+        """
+        
+        assert 0 <= address <= 255
+        return b"a" + _VDVHEX_BYTES[address], 2, self.parse_DS120
     
     def DS020(self, address):
         """
@@ -417,8 +612,7 @@ class IBISProtocol:
         The address of the display
         """
         
-        return self.parse_DS120(self.send_telegram("a{}"
-            .format(self.vdv_hex(address)), reply_length = 2))
+        return self._query(*self._DS020_query(address))
     
     def parse_DS120(self, telegram):
         if not telegram:
@@ -436,6 +630,14 @@ class IBISProtocol:
         }
         return reply
     
+    def _DS201_query(self, address):
+        """
+        Telegram, reply length and parser for DS201
+        """
+        
+        assert 0 <= address <= 255
+        return b"aV" + _VDVHEX_BYTES[address], 8, self.parse_DS1201
+    
     def DS201(self, address):
         """
         Display version query
@@ -445,8 +647,7 @@ class IBISProtocol:
         The address of the display
         """
         
-        return self.parse_DS1201(self.send_telegram("aV{}"
-            .format(self.vdv_hex(address)), reply_length = 8))
+        return self._query(*self._DS201_query(address))
     
     def parse_DS1201(self, telegram):
         if not telegram:
@@ -468,8 +669,8 @@ class IBISProtocol:
         The destination text
         """
         
-        num_blocks = math.ceil(len(text) / 16)
-        return self.send_telegram("aA{}{}{}"
+        num_blocks = (len(text) + 15) >> 4
+        return self.send_str("aA{}{}{}"
             .format(self.vdv_hex(address),
                 self.vdv_hex(num_blocks),
                 text.ljust(num_blocks*16)))
@@ -491,14 +692,23 @@ class IBISProtocol:
         Connection information
         """
         
-        data = "\x03{:>02}\x04{}\x05{}".format(
-            stop_id, stop_text, change_text)
+        data = b"".join((
+            b"\x03",
+            self.process_special_characters("{:>02}".format(stop_id)),
+            b"\x04",
+            self.process_special_characters(stop_text),
+            b"\x05",
+            self.process_special_characters(change_text)
+        ))
         num_blocks, remainder = divmod(len(data), 16)
-        return self.send_telegram("aL{}{}{}{}"
-            .format(self.vdv_hex(address),
-                self.vdv_hex(num_blocks),
-                self.vdv_hex(remainder),
-                data))
+        assert 0 <= address <= 255 and num_blocks <= 255
+        return self.send_raw(b"".join((
+            b"aL",
+            _VDVHEX_BYTES[address],
+            _VDVHEX_BYTES[num_blocks],
+            _VDVHEX_BYTES[remainder],
+            data
+        )))
 
     def DS021t(self, address, text):
         """
@@ -511,14 +721,22 @@ class IBISProtocol:
         The destination text
         """
 
-        num_blocks = math.ceil(len(text) / 16)
+        num_blocks = (len(text) + 15) >> 4
         if '\n' not in text:
             text = text + '\n'
-        return self.send_telegram("aA{}{}A0{}\n\n  "
+        return self.send_str("aA{}{}A0{}\n\n  "
             .format(self.vdv_hex(address),
                 self.vdv_hex(num_blocks),
                 text))
     
+    def _DS060_query(self, direction):
+        """
+        Telegram, reply length and parser for DS060
+        """
+        
+        return (self.process_special_characters("o{}S".format(direction)),
+            3, self.parse_DS160)
+    
     def DS060(self, direction):
         """
         Query locating device status
@@ -528,8 +746,7 @@ class IBISProtocol:
         Either A, B or C
         """
         
-        return self.parse_DS160(self.send_telegram("o{}S"
-            .format(direction), reply_length = 3))
+        return self._query(*self._DS060_query(direction))
     
     def parse_DS160(self, telegram):
         if not telegram:
@@ -545,6 +762,14 @@ class IBISProtocol:
         }
         return reply
     
+    def _DS601_query(self, direction):
+        """
+        Telegram, reply length and parser for DS601
+        """
+        
+        return (self.process_special_characters("o{}V".format(direction)),
+            18, self.parse_DS1201)
+    
     def DS601(self, direction):
         """
         Query locating device version
@@ -554,8 +779,7 @@ class IBISProtocol:
         Either A, B or C
         """
         
-        return self.parse_DS1201(self.send_telegram("o{}V"
-            .format(direction), reply_length = 18))
+        return self._query(*self._DS601_query(direction))
     
     def parse_DS1601(self, telegram):
         if not telegram:
@@ -566,6 +790,14 @@ class IBISProtocol:
         }
         return reply
     
+    def _DS061_query(self, direction):
+        """
+        Telegram, reply length and parser for DS061
+        """
+        
+        return (self.process_special_characters("o{}D".format(direction)),
+            10, self.parse_DS161)
+    
     def DS061(self, direction):
         """
         Query locating device data
@@ -575,17 +807,16 @@ class IBISProtocol:
         Either A, B or C
         """
         
-        return self.parse_DS161(self.send_telegram("o{}D"
-            .format(direction), reply_length = 10))
+        return self._query(*self._DS061_query(direction))
     
     def parse_DS161(self, telegram):
         if not telegram:
             return None
-        beacon_id_vdvhex = telegram[2:]
-        beacon_id = 0x00
-        for n in range(8):
-            char = beacon_id_vdvhex[n]
-            beacon_id |= self.vdv_hex(char) << ((7 - n) * 4)
+        beacon_id_vdvhex = telegram[2:10]
+        # int() alone would also accept whitespace, signs and short replies
+        if len(beacon_id_vdvhex) != 8 or beacon_id_vdvhex.strip(_VDVHEX):
+            raise ValueError("Invalid DS161 beacon ID: {!r}".format(beacon_id_vdvhex))
+        beacon_id = int(beacon_id_vdvhex.translate(_VDVHEX_TO_HEX), 16)
         reply = {
             'beacon_id': beacon_id
         }
@@ -596,22 +827,27 @@ class IBISProtocol:
         Send an LSA radio telegram
         """
         
-        radio_telegram = "{}{}{:02d}{}{}{:0>4}{}{:03d}{:02d}{:03d}{}".format(
-            self.vdv_hex(channel),
-            self.vdv_hex(0),
-            radio_telegram_type,
-            self.vdv_hex(delay),
-            self.vdv_hex(6), # Number of extra bytes
-            reporting_point_id,
-            self.vdv_hex(hand),
-            line_number,
-            course_number,
-            destination_id,
-            self.vdv_hex(train_length)
-        )
-        return self.parse_DS160(self.send_telegram("oFM{}{}"
-            .format(self.vdv_hex(math.ceil(len(radio_telegram) / 2)),
-                radio_telegram), reply_length = 3))
+        assert 0 <= channel <= 255 and 0 <= delay <= 255
+        assert 0 <= hand <= 255 and 0 <= train_length <= 255
+        radio_telegram = b"".join((
+            _VDVHEX_BYTES[channel],
+            b"0",
+            "{:02d}".format(radio_telegram_type).encode('ascii'),
+            _VDVHEX_BYTES[delay],
+            b"6", # Number of extra bytes
+            self.process_special_characters("{:0>4}".format(reporting_point_id)),
+            _VDVHEX_BYTES[hand],
+            "{:03d}{:02d}{:03d}".format(line_number, course_number,
+                destination_id).encode('ascii'),
+            _VDVHEX_BYTES[train_length]
+        ))
+        num_words = (len(radio_telegram) + 1) >> 1
+        assert num_words <= 255
+        return self.parse_DS160(self.send_raw(b"".join((
+            b"oFM",
+            _VDVHEX_BYTES[num_words],
+            radio_telegram
+        )), reply_length = 3))
     
     def GSP(self, address, line1 = "", line2 = ""):
         """
@@ -635,7 +871,7 @@ class IBISProtocol:
         lines += line2
         lines += "\x0a\x0a"
         
-        num_blocks = math.ceil(len(lines) / 16)
+        num_blocks = (len(lines) + 15) >> 4
         remainder = len(lines) % 16
         if remainder:
             filler = " " * (16 - remainder)
@@ -648,4 +884,4 @@ class IBISProtocol:
             lines = lines,
             filler = filler)
         
-        return self.parse_DS120(self.send_telegram(data, reply_length = 2))
\ No newline at end of file
+        return self.parse_DS120(self.send_str(data, reply_length = 2))
\ No newline at end of file
@@ -12,19 +12,28 @@ class SerialIBISMaster(IBISProtocol):
         """
         port:
         The serial port to use for communication
+        OR an already opened pyserial port object to share
+        (the port settings given here are ignored in that case,
+        and masters sharing a port must not poll it at the same time)
         """
         
         super().__init__(*args, **kwargs)
         
-        self.port = port
-        self.device = serial.Serial(
-            self.port,
-            baudrate = baudrate,
-            bytesize = bytesize,
-            parity = parity,
-            stopbits = stopbits,
-            timeout = timeout
-        )
+        if isinstance(port, serial.SerialBase):
+            self.port = port.port
+            self.device = port
+            self._owns_device = False
+        else:
+            self.port = port
+            self.device = serial.Serial(
+                self.port,
+                baudrate = baudrate,
+                bytesize = bytesize,
+                parity = parity,
+                stopbits = stopbits,
+                timeout = timeout
+            )
+            self._owns_device = True
     
     def _send(self, telegram):
         """
@@ -32,6 +41,9 @@ class SerialIBISMaster(IBISProtocol):
         This varies depending on implementation
         """
         
+        # Drop late replies to earlier telegrams so they can't be
+        # mistaken for the reply to this one
+        self.device.reset_input_buffer()
         self.device.write(telegram)
     
     def _receive(self, length):
@@ -43,4 +55,5 @@ class SerialIBISMaster(IBISProtocol):
         return self.device.read(length)
 
     def __del__(self):
-        self.device.close()
+        if self._owns_device:
+            self.device.close()
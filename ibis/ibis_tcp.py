@@ -24,6 +24,11 @@ class TCPIBISMaster(IBISProtocol):
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.connect((host, port))
         self.socket.settimeout(timeout)
+        # Telegrams are tiny request/reply exchanges, send them right away
+        # instead of letting Nagle's algorithm wait for outstanding ACKs
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Reusable receive buffer
+        self._rx_buffer = bytearray(4096)
     
     def _send(self, telegram):
         """
@@ -31,7 +36,7 @@ class TCPIBISMaster(IBISProtocol):
         This varies depending on implementation
         """
         
-        self.socket.send(telegram)
+        self.socket.sendall(telegram)
     
     def _receive(self, length):
         """
@@ -39,7 +44,16 @@ class TCPIBISMaster(IBISProtocol):
         This varies depending on implementation and needs to be overridden
         """
         
-        return self.socket.recv(length)
+        if length > len(self._rx_buffer):
+            self._rx_buffer = bytearray(length)
+        rx_view = memoryview(self._rx_buffer)
+        received = 0
+        while received < length:
+            count = self.socket.recv_into(rx_view[received:length])
+            if not count:
+                raise ConnectionError("Connection closed by remote host")
+            received += count
+        return bytes(rx_view[:length])
 
     def __del__(self):
         self.socket.close()
\ No newline at end of file
@@ -63,11 +63,11 @@ class MONOProtocol:
         Whether to print the frame as sent or received
         """
         
-        if self.debug:
-            action = "Received" if receive else "Sending"
-            frame_debug = " ".join("{:02X}".format(byte) for byte in frame)
-            print("{} frame:".format(action))
-            print(frame_debug)
+        if not self.debug:
+            return
+        action = "Received" if receive else "Sending"
+        print("{} frame:".format(action))
+        print(bytes(frame).hex(" ").upper())
     
     def checksum_led(self, payload):
         """